@@ -5,9 +5,16 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-import plotly.express as px
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+import plotly.graph_objects as go
+import plotly.io as pio
+import os
 from io import BytesIO
+from pathlib import Path
 import requests
+import xlsxwriter
 from streamlit_option_menu import option_menu
 from datetime import date
 
@@ -20,30 +27,45 @@ st.set_page_config(
     layout="wide",
     initial_sidebar_state="expanded",
 )
+pio.json.config.default_engine = "orjson"   # serialización JSON de figuras más rápida
 
 # ------------------------------------------------------------
 # 2. UTILIDADES
 # ------------------------------------------------------------
 def get_data(seed: int = 42, n: int = 5000) -> pd.DataFrame:
     """Genera datos sintéticos de ventas reproducibles."""
-    np.random.seed(seed)
-    dates = pd.date_range("2024-01-01", "2025-07-31", freq="D")
+    rng = np.random.default_rng(seed)
+    inicio, fin = pd.Timestamp("2024-01-01"), pd.Timestamp("2025-07-31")
+    ndays = (fin - inicio).days + 1
+    offsets = rng.integers(0, ndays, n)
+    fechas = (inicio.to_numpy() + offsets.astype("timedelta64[D]")).astype("datetime64[ns]")
     categories = ["Electrónica", "Ropa", "Hogar", "Alimentos"]
     regions = ["Norte", "Sur", "Este", "Oeste"]
+    cat_codes = rng.integers(0, len(categories), n, dtype=np.int8)
+    reg_codes = rng.integers(0, len(regions), n, dtype=np.int8)
 
     return pd.DataFrame({
-        "Fecha": np.random.choice(dates, n),
-        "Categoría": np.random.choice(categories, n),
-        "Región": np.random.choice(regions, n),
-        "Ventas": np.random.gamma(shape=5, scale=120, size=n).round(2),
+        "Fecha": fechas,
+        "Categoría": pd.Categorical.from_codes(cat_codes, categories=categories),
+        "Región": pd.Categorical.from_codes(reg_codes, categories=regions),
+        "Ventas": rng.gamma(shape=5, scale=120, size=n).round(2),
     })
 
+SEP_ES = str.maketrans({",": ".", ".": ","})   # intercambia separadores en una pasada
+
 def fmt_moneda(x, dec=0):
     """Formatea números a moneda en español CO/ES (puntos miles, coma dec)."""
     if pd.isna(x):
         return "—"
     pattern = f"{{:,.{dec}f}}"
-    return "$" + pattern.format(x).replace(",", "X").replace(".", ",").replace("X", ".")
+    return "$" + pattern.format(x).translate(SEP_ES)
+
+def fmt_moneda_serie(s, dec=0):
+    """Versión vectorizada de fmt_moneda para una Serie completa."""
+    if s.empty:   # map() sobre una Serie vacía conserva el dtype float y .str falla
+        return pd.Series(dtype=object, index=s.index)
+    txt = "$" + s.round(dec).map(f"{{:,.{dec}f}}".format).str.translate(SEP_ES)
+    return txt.where(s.notna(), "—")
 
 def delta_pct(actual, pasado):
     if pasado in (0, None) or pd.isna(pasado):
@@ -58,8 +80,21 @@ def badge(pct):
     color = "#16a34a" if pct >= 0 else "#dc2626"
     return f"<span style='color:{color};font-size:0.85rem;'>{arrow} {pct:,.1f}%</span>"
 
+def kpi_card(valor, etiqueta, prev):
+    """Bloque HTML .kpi con valor formateado y badge de variación."""
+    dec = 2 if etiqueta == "Promedio por Orden" else 0
+    return f"""
+    <div class='kpi'>
+      <span class='val'>{fmt_moneda(valor, dec)}</span>
+      <div class='lab'>{etiqueta}</div>
+      <span class='del'>{badge(delta_pct(valor, prev))}</span>
+    </div>"""
+
 def periodo_anterior(df, rango, modo="dias"):
-    """Devuelve DataFrame del periodo comparable (anterior o mismo rango hace 1 año)."""
+    """Devuelve DataFrame del periodo comparable (anterior o mismo rango hace 1 año).
+
+    `df` debe venir ordenado por Fecha: el periodo se ubica con búsqueda binaria.
+    """
     ini, fin = pd.to_datetime(rango[0]), pd.to_datetime(rango[1])
     if modo == "dias":           # mismo nº de días inmediatamente anterior
         dias = (fin - ini).days + 1
@@ -68,14 +103,89 @@ def periodo_anterior(df, rango, modo="dias"):
     else:                        # 'anio': mismo rango pero -1 año
         ini_prev = ini - pd.DateOffset(years=1)
         fin_prev = fin - pd.DateOffset(years=1)
-    return df[(df["Fecha"] >= ini_prev) & (df["Fecha"] <= fin_prev)]
+    fechas = df["Fecha"].values
+    i0 = np.searchsorted(fechas, ini_prev.to_datetime64(), side="left")
+    i1 = np.searchsorted(fechas, fin_prev.to_datetime64(), side="right")
+    return df.iloc[i0:i1]
 
 # ------------------------------------------------------------
 # 3. CARGA DE DATOS (caché)
 # ------------------------------------------------------------
+CACHE_DIR = Path(__file__).parent / ".cache"
+DATA_VERSION = 3   # subir cuando cambie get_data (columnas, dtypes o muestreo)
+
+@st.cache_data
+def load_df(seed: int = 42, n: int = 5000):
+    """Lee el dataset desde Parquet; lo genera y persiste solo la primera vez."""
+    path = CACHE_DIR / f"ventas_v{DATA_VERSION}_{seed}_{n}.parquet"
+    if path.exists():
+        return pd.read_parquet(path, engine="pyarrow")
+    df = get_data(seed, n)
+    tmp = path.with_suffix(f".{os.getpid()}.tmp")
+    try:   # escritura atómica; si el disco es de solo lectura, se sirve sin caché
+        CACHE_DIR.mkdir(exist_ok=True)
+        df.to_parquet(tmp, engine="pyarrow", index=False)
+        os.replace(tmp, path)
+    except OSError:
+        tmp.unlink(missing_ok=True)
+    return df
+
+@st.cache_data
+def load_df_sorted():
+    """Copia del dataset ordenada por Fecha (para periodo_anterior)."""
+    return load_df().sort_values("Fecha", ignore_index=True)
+
+@st.cache_data
+def filter_df(rango, regiones, categorias):
+    """Aplica los filtros del sidebar; claves hashables para la caché."""
+    df_full = load_df()
+    lo, hi = pd.Timestamp(rango[0]), pd.Timestamp(rango[1])
+    mask = (
+        df_full["Fecha"].between(lo, hi) &
+        df_full["Región"].isin(regiones) &
+        df_full["Categoría"].isin(categorias)
+    )
+    return df_full[mask]
+
+@st.cache_data
+def aggregates(rango, regiones, categorias):
+    """Agregados de las tres gráficas, calculados una sola vez por filtro."""
+    df = filter_df(rango, regiones, categorias)
+    agg_cat = df.groupby("Categoría", observed=True)["Ventas"].sum().sort_values()
+    agg_reg = df.groupby("Región", observed=True)["Ventas"].sum().reset_index()
+    agg_mensual = df.resample("ME", on="Fecha")["Ventas"].sum().reset_index()
+    return agg_cat, agg_reg, agg_mensual
+
 @st.cache_data
-def load_df():
-    return get_data()
+def load_prev(rango, modo, regiones, categorias):
+    prev = periodo_anterior(load_df_sorted(), rango, modo=modo)
+    return prev[prev["Región"].isin(regiones) & prev["Categoría"].isin(categorias)]
+
+@st.cache_data
+def to_csv_bytes(rango, regiones, categorias):
+    """CSV de los datos filtrados; la clave es el filtro, no el DataFrame."""
+    tbl = pa.Table.from_pandas(filter_df(rango, regiones, categorias), preserve_index=False)
+    i = tbl.schema.get_field_index("Fecha")
+    tbl = tbl.set_column(i, "Fecha", pc.cast(tbl["Fecha"], pa.date32()))   # YYYY-MM-DD
+    buf = BytesIO()
+    # "needed" entrecomilla todas las cadenas y el encabezado (Arrow no tiene el
+    # QUOTE_MINIMAL de pandas); "none" fallaría con cualquier valor que lleve comas
+    pacsv.write_csv(tbl, buf, pacsv.WriteOptions(quoting_style="needed"))
+    return buf.getvalue()
+
+@st.cache_data
+def to_xlsx_bytes(rango, regiones, categorias):
+    """Excel de los datos filtrados; la clave es el filtro, no el DataFrame."""
+    df = filter_df(rango, regiones, categorias)
+    buf = BytesIO()
+    # constant_memory solo admite escritura fila a fila, por eso no df.to_excel
+    wb = xlsxwriter.Workbook(buf, {"constant_memory": True, "default_date_format": "yyyy-mm-dd"})
+    ws = wb.add_worksheet("Ventas")
+    ws.write_row(0, 0, df.columns, wb.add_format({"bold": True}))
+    for i, fila in enumerate(df.itertuples(index=False, name=None), start=1):
+        ws.write_row(i, 0, fila)
+    wb.close()
+    return buf.getvalue()
 
 df_full = load_df()
 
@@ -101,6 +211,8 @@ html,body,[class*="css"]{font-family:'Inter',sans-serif;}
 .hero h1{margin:0 0 .3rem 0;font-size:2.1rem;}
 .hero p {margin:0;font-size:1rem;color:#e5e7eb;}
 /* ---------- KPI ---------- */
+.kpi-row{display:flex;flex-wrap:wrap;gap:1rem;}
+.kpi-row .kpi{flex:1 1 12rem;}
 .kpi{background:var(--glass-bg);border:1px solid var(--glass-brd);
      backdrop-filter:blur(var(--blur));border-radius:16px;
      padding:1.3rem 1rem;text-align:center;transition:transform .2s;}
@@ -127,8 +239,10 @@ with st.sidebar:
     dmin, dmax = df_full["Fecha"].min(), df_full["Fecha"].max()
     rango = st.date_input("Rango de fechas", value=(dmin, dmax), min_value=dmin, max_value=dmax)
 
-    regiones = st.multiselect("Región", df_full["Región"].unique(), default=list(df_full["Región"].unique()))
-    categorias = st.multiselect("Categoría", df_full["Categoría"].unique(), default=list(df_full["Categoría"].unique()))
+    opts_reg = list(df_full["Región"].cat.categories)
+    opts_cat = list(df_full["Categoría"].cat.categories)
+    regiones = st.multiselect("Región", opts_reg, default=opts_reg)
+    categorias = st.multiselect("Categoría", opts_cat, default=opts_cat)
 
     modo_comp = st.radio("Comparar contra:", ["Periodo anterior", "Mismo periodo año anterior", "Sin comparación"], index=0)
     st.caption("Creado con ❤️ usando Streamlit")
@@ -136,12 +250,8 @@ with st.sidebar:
 # ------------------------------------------------------------
 # 6. FILTRADO PRINCIPAL
 # ------------------------------------------------------------
-df = df_full[
-    (df_full["Fecha"].dt.date >= rango[0]) &
-    (df_full["Fecha"].dt.date <= rango[1]) &
-    (df_full["Región"].isin(regiones)) &
-    (df_full["Categoría"].isin(categorias))
-].copy()
+filtros = (tuple(rango), tuple(sorted(regiones)), tuple(sorted(categorias)))
+df = filter_df(*filtros)
 
 # ------------------------------------------------------------
 # 7. HERO (texto + animación Lottie vía HTML)
@@ -164,32 +274,22 @@ st.markdown(hero_html, unsafe_allow_html=True)
 # ------------------------------------------------------------
 # 8. KPIs + comparación
 # ------------------------------------------------------------
-tot = df["Ventas"].sum()
-avg = df["Ventas"].mean()
-cnt = df.shape[0]
+tot, avg, cnt = df["Ventas"].agg(["sum", "mean", "count"])
 
 if modo_comp != "Sin comparación":
     modo_calc = "dias" if modo_comp == "Periodo anterior" else "anio"
-    prev_df = periodo_anterior(df_full, rango, modo=modo_calc)
-    prev_tot, prev_avg, prev_cnt = prev_df["Ventas"].sum(), prev_df["Ventas"].mean(), prev_df.shape[0]
+    prev_df = load_prev(filtros[0], modo_calc, *filtros[1:])
+    prev_tot, prev_avg, prev_cnt = prev_df["Ventas"].agg(["sum", "mean", "count"])
 else:
     prev_tot = prev_avg = prev_cnt = np.nan
 
-col1, col2, col3 = st.columns(3)
-for col, valor, etiqueta, prev in [
-    (col1, tot, "Ventas Totales", prev_tot),
-    (col2, avg, "Promedio por Orden", prev_avg),
-    (col3, cnt, "Número de Órdenes", prev_cnt),
-]:
-    with col:
-        pct = delta_pct(valor, prev)
-        col.markdown(f"""
-        <div class='kpi'>
-          <span class='val'>{fmt_moneda(valor, 0 if etiqueta!='Promedio por Orden' else 2)}</span>
-          <div class='lab'>{etiqueta}</div>
-          <span class='del'>{badge(pct)}</span>
-        </div>
-        """, unsafe_allow_html=True)
+kpis = [
+    (tot, "Ventas Totales", prev_tot),
+    (avg, "Promedio por Orden", prev_avg),
+    (cnt, "Número de Órdenes", prev_cnt),
+]
+kpi_html = "<div class='kpi-row'>" + "".join(kpi_card(v, e, p) for v, e, p in kpis) + "</div>"
+st.markdown(kpi_html, unsafe_allow_html=True)
 
 # ------------------------------------------------------------
 # 9. MENÚ HORIZONTAL (Option-Menu)
@@ -211,64 +311,72 @@ seleccion = option_menu(
 # ------------------------------------------------------------
 # 10. CONTENIDO SEGÚN SELECCIÓN
 # ------------------------------------------------------------
+FILAS_POR_PAGINA = 200
+
 if seleccion == "Visualizaciones":
+    cat, reg, mensual = aggregates(*filtros)
     a, b = st.columns((3,2))
 
     # --- Barras por categoría ---
     with a:
         st.subheader("Ventas por Categoría")
-        cat = df.groupby("Categoría")["Ventas"].sum().sort_values()
-        fig_bar = px.bar(
-            cat, x=cat.values, y=cat.index, orientation="h",
-            color=cat.values, text_auto=".2s",
-            color_continuous_scale=["#ff4b4b","#f72585","#b5179e","#7209b7"],
-            labels={"x":"Ventas","y":"Categoría"},
-            template="plotly_white",
-        ).update_layout(coloraxis_showscale=False, margin=dict(l=10,r=10,t=40,b=10))
-        fig_bar.update_traces(hovertemplate="<b>%{y}</b><br>Ventas: %{x:,.2f}<extra></extra>")
+        fig_bar = go.Figure(go.Bar(
+            x=cat.values, y=cat.index.astype(str), orientation="h",
+            marker=dict(color=cat.values,
+                        colorscale=["#ff4b4b","#f72585","#b5179e","#7209b7"]),
+            texttemplate="%{x:.2s}",
+            hovertemplate="<b>%{y}</b><br>Ventas: %{x:,.2f}<extra></extra>",
+        ))
+        fig_bar.update_layout(template="plotly_white", xaxis_title="Ventas", yaxis_title="Categoría",
+                              margin=dict(l=10,r=10,t=40,b=10))
         st.plotly_chart(fig_bar, use_container_width=True)
 
     # --- Pie por región ---
     with b:
         st.subheader("Distribución por Región")
-        reg = df.groupby("Región")["Ventas"].sum().reset_index()
-        fig_pie = px.pie(
-            reg, names="Región", values="Ventas", hole=0.45,
-            template="plotly_white",
-        )
-        fig_pie.update_traces(textposition="inside", textinfo="percent+label",
-                              hovertemplate="<b>%{label}</b><br>Ventas: %{value:,.2f}<extra></extra>")
+        fig_pie = go.Figure(go.Pie(
+            labels=reg["Región"].astype(str), values=reg["Ventas"], hole=0.45,
+            textposition="inside", textinfo="percent+label",
+            hovertemplate="<b>%{label}</b><br>Ventas: %{value:,.2f}<extra></extra>",
+        ))
+        fig_pie.update_layout(template="plotly_white")
         st.plotly_chart(fig_pie, use_container_width=True)
 
     # --- Área mensual ---
     st.subheader("Tendencia Mensual de Ventas")
-    mensual = df.resample("ME", on="Fecha")["Ventas"].sum().reset_index()
-    fig_area = px.area(mensual, x="Fecha", y="Ventas",
-                       labels={"Fecha":"Mes","Ventas":"Ventas"},
-                       template="plotly_white")
-    fig_area.update_traces(hovertemplate="<b>%{x|%Y-%m}</b><br>Ventas: %{y:,.2f}<extra></extra>")
+    fig_area = go.Figure(go.Scattergl(
+        x=mensual["Fecha"], y=mensual["Ventas"], mode="lines", fill="tozeroy",
+        hovertemplate="<b>%{x|%Y-%m}</b><br>Ventas: %{y:,.2f}<extra></extra>",
+    ))
+    fig_area.update_layout(template="plotly_white", xaxis_title="Mes", yaxis_title="Ventas")
     st.plotly_chart(fig_area, use_container_width=True)
 
 elif seleccion == "Detalle de Datos":
     st.subheader("Tabla de Detalle")
-    tabla = df.copy()
-    tabla["Fecha"] = tabla["Fecha"].dt.strftime("%Y-%m-%d")
-    tabla["Ventas"] = tabla["Ventas"].map(lambda x: fmt_moneda(x,2))
-    st.dataframe(tabla.sort_values("Fecha", ascending=False), use_container_width=True, height=500)
+    if df.empty:
+        st.info("No hay datos para los filtros seleccionados.")
+    else:
+        paginas = max(1, -(-len(df) // FILAS_POR_PAGINA))
+        page = st.number_input("Página", min_value=1, max_value=paginas, value=1, step=1)
+        st.caption(f"{len(df):,} filas · {paginas} páginas".replace(",", "."))
+
+        # Ordenar sobre los datos crudos y formatear solo la ventana visible
+        ini = (page - 1) * FILAS_POR_PAGINA
+        vista = df.sort_values("Fecha", ascending=False).iloc[ini:ini + FILAS_POR_PAGINA]
+        tabla = vista.assign(
+            Fecha=vista["Fecha"].dt.strftime("%Y-%m-%d"),
+            Ventas=fmt_moneda_serie(vista["Ventas"], 2),
+        )
+        st.dataframe(tabla, use_container_width=True, height=500)
 
 else:  # Exportar
     st.subheader("Descargar Datos Filtrados")
 
-    csv = df.to_csv(index=False).encode("utf-8")
-    buf = BytesIO()
-    with pd.ExcelWriter(buf, engine="openpyxl") as w:
-        df.to_excel(w, index=False, sheet_name="Ventas")
-
     c1, c2 = st.columns(2)
     with c1:
-        if st.download_button("⬇️ CSV", csv, "ventas_filtradas.csv", "text/csv"):
+        if st.download_button("⬇️ CSV", to_csv_bytes(*filtros), "ventas_filtradas.csv", "text/csv"):
             st.success("CSV descargado")
     with c2:
-        if st.download_button("⬇️ Excel", buf.getvalue(), "ventas_filtradas.xlsx",
+        if st.download_button("⬇️ Excel", to_xlsx_bytes(*filtros), "ventas_filtradas.xlsx",
                               "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"):
             st.success("Excel descargado")
\ No newline at end of file